@@ -0,0 +1,327 @@
+# Offline benchmark suite for the backend: micro-benchmarks plus an HTTP load scenario.
+# Usage: python benchmark.py [--out results.json] [--baseline old.json]
+# Runs against a throwaway SQLite database seeded from Dump20251222.sql, a stubbed Gemini client
+# and a randomly initialized ResNet-18 when the checkpoint is missing.
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent
+REPO_DIR = BACKEND_DIR.parent
+
+# Share of each scenario in the HTTP load mix
+LOAD_MIX = {"feed": 30, "detail": 25, "comments": 15, "notifications": 20, "predict": 5, "chat": 5}
+
+# Questions sent to the (stubbed) Chef AI in the chat scenario
+CHAT_MESSAGES = ["How do I cook phở at home?", "Bánh mì có nguồn gốc từ đâu?", "What should I eat in Huế?"]
+
+# Stand-in for the Gemini chat model so benchmarks never call the network
+class StubChatModel:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def start_chat(self, history=None):
+        return self
+
+    def send_message(self, message):
+        if self.latency: time.sleep(self.latency)
+        return type("StubResponse", (), {"text": f"Stub reply to: {message}"})()
+
+# Split "(1,'a',NULL),(2,'b',3.5)" from a MySQL dump into rows of Python values
+def parse_dump_values(values: str):
+    escapes = {"0": "\0", "n": "\n", "r": "\r", "t": "\t", "Z": "\x1a"}
+    rows, row, i = [], None, 0
+    while i < len(values):
+        ch = values[i]
+        if ch == "(":
+            row = []
+        elif ch == ")":
+            rows.append(row)
+        elif ch == "'":
+            chars = []
+            i += 1
+            while values[i] != "'":
+                if values[i] == "\\":
+                    i += 1
+                    chars.append(escapes.get(values[i], values[i]))
+                else:
+                    chars.append(values[i])
+                i += 1
+            row.append("".join(chars))
+        elif ch not in ", ;\n":
+            token = re.match(r"[^,)]+", values[i:]).group(0)
+            i += len(token) - 1
+            token = token.strip()
+            row.append(None if token == "NULL" else float(token) if "." in token else int(token))
+        i += 1
+    return rows
+
+# Load the rows of a mysqldump file into the (empty) database behind the server models
+def seed_from_dump(server, dump_path: Path):
+    from sqlalchemy import Boolean, DateTime
+    sql = dump_path.read_text(encoding="utf-8")
+    columns = {t: re.findall(r"^\s+`(\w+)`", body, re.M)
+               for t, body in re.findall(r"CREATE TABLE `(\w+)` \((.*?)\n\)", sql, re.S)}
+    tables = server.Base.metadata.tables
+    # Insert parents first so foreign keys hold on databases that enforce them
+    order = ["users", "foods", "comments", "notifications", "system_logs"]
+    inserts = {t: v for t, v in re.findall(r"^INSERT INTO `(\w+)` VALUES (.*);$", sql, re.M)}
+    with server.engine.begin() as conn:
+        for name in [t for t in order if t in inserts and t in tables]:
+            table = tables[name]
+            rows = []
+            for values in parse_dump_values(inserts[name]):
+                row = {}
+                for col, value in zip(columns[name], values):
+                    if col not in table.c: continue
+                    if isinstance(table.c[col].type, DateTime) and isinstance(value, str):
+                        value = datetime.fromisoformat(value)
+                    elif isinstance(table.c[col].type, Boolean) and value is not None:
+                        value = bool(value)
+                    row[col] = value
+                rows.append(row)
+            conn.execute(table.insert(), rows)
+
+# Build a ResNet-18 with random weights and 36 dummy classes when no checkpoint is available
+def random_model(num_classes: int = 36):
+    import torch
+    from torchvision import models
+    torch.manual_seed(0)
+    m = models.resnet18(weights=None)
+    m.fc = torch.nn.Linear(m.fc.in_features, num_classes)
+    m.eval()
+    return m, [f"class_{i}" for i in range(num_classes)]
+
+# Use a real food photo from the frontend assets, or a synthetic JPEG
+def sample_image_bytes() -> bytes:
+    images = sorted((REPO_DIR / "public" / "food_images").glob("*.jpg"))
+    if images: return images[0].read_bytes()
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.effect_noise((640, 480), 64).convert("RGB").save(buf, format="JPEG")
+    return buf.getvalue()
+
+# Linear-interpolated percentile of an already sorted list
+def percentile(values, q: float) -> float:
+    if not values: return 0.0
+    pos = (len(values) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+# Summarize latencies (seconds) into milliseconds, adding throughput when the wall time is known
+def summarize(latencies, wall_time: float = None, errors: int = 0) -> dict:
+    values = sorted(latencies)
+    stats = {
+        "count": len(values),
+        "errors": errors,
+        "mean_ms": sum(values) / len(values) * 1000 if values else 0.0,
+        "p50_ms": percentile(values, 0.50) * 1000,
+        "p95_ms": percentile(values, 0.95) * 1000,
+        "p99_ms": percentile(values, 0.99) * 1000,
+    }
+    stats["throughput_rps"] = len(values) / wall_time if wall_time else (1 / (stats["mean_ms"] / 1000) if values and stats["mean_ms"] else 0.0)
+    return stats
+
+# Time repeated calls of fn; with batch > 1 each sample is the mean of that many calls
+def run_micro(fn, iterations: int, warmup: int, batch: int = 1) -> dict:
+    for _ in range(warmup): fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        for _ in range(batch): fn()
+        samples.append((time.perf_counter() - start) / batch)
+    return summarize(samples)
+
+# Time inference, feed serialization and URL formatting in isolation
+def micro_benchmarks(server, image_bytes: bytes, iterations: int, warmup: int) -> dict:
+    from fastapi.encoders import jsonable_encoder
+    results = {}
+    results["predict_image_ai"] = run_micro(
+        lambda: server.predict_image_ai(server.model_ai, image_bytes, server.CLASS_NAMES), iterations, warmup)
+
+    def feed():
+        db = server.SessionLocal()
+        try: return jsonable_encoder(server.get_all_foods(db))
+        finally: db.close()
+    results["get_all_foods"] = run_micro(feed, iterations, warmup)
+
+    db = server.SessionLocal()
+    try:
+        urls = [f.image_url for f in db.query(server.Food).all()] + [u.photo_url for u in db.query(server.User).all()]
+    finally: db.close()
+    urls = urls or ["static/food_images/a.jpg", "https://example.com/a.jpg", "/food_images/pho.jpg"]
+    cycle = iter(urls * (iterations + warmup + 1) * 100)
+    results["fix_url"] = run_micro(lambda: server.fix_url(next(cycle)), iterations, warmup, batch=100)
+    return results
+
+# Pick the slugs and user ids the load scenario will request
+def load_targets(server):
+    db = server.SessionLocal()
+    try:
+        slugs = [s for (s,) in db.query(server.Food.slug).all()] or ["pho"]
+        comment_slugs = [s for (s,) in db.query(server.Comment.food_slug).distinct().all()] or slugs
+        uids = [u for (u,) in db.query(server.Notification.user_uid).distinct().all()]
+        uids = uids or [u for (u,) in db.query(server.User.uid).all()] or ["benchmark-user"]
+    finally: db.close()
+    return slugs, comment_slugs, uids
+
+# Replay a seeded mix of requests with a fixed number of concurrent clients
+async def run_load(app, base_url: str, targets, image_bytes: bytes, total: int, concurrency: int, seed: int) -> dict:
+    import httpx
+    slugs, comment_slugs, uids = targets
+    rng = random.Random(seed)
+    names = list(LOAD_MIX)
+    plan = rng.choices(names, weights=[LOAD_MIX[n] for n in names], k=total)
+    ops = []
+    for name in plan:
+        if name == "feed": ops.append((name, "GET", "/api/foods", None))
+        elif name == "detail": ops.append((name, "GET", f"/api/foods/{rng.choice(slugs)}", None))
+        elif name == "comments": ops.append((name, "GET", f"/api/comments/{rng.choice(comment_slugs)}", None))
+        elif name == "notifications": ops.append((name, "GET", f"/api/notifications/{rng.choice(uids)}", None))
+        elif name == "chat": ops.append((name, "POST", "/api/chat", {"message": rng.choice(CHAT_MESSAGES), "history": []}))
+        else: ops.append((name, "POST", "/api/predict", None))
+
+    latencies = {n: [] for n in names}
+    errors = {n: 0 for n in names}
+    queue = iter(ops)
+    transport = httpx.ASGITransport(app=app) if app is not None else None
+
+    async def worker(client):
+        for name, method, path, body in queue:
+            files = {"file": ("food.jpg", image_bytes, "image/jpeg")} if name == "predict" else None
+            start = time.perf_counter()
+            try:
+                resp = await client.request(method, path, files=files, json=body)
+                failed = resp.status_code >= 400 or (name == "predict" and "error" in resp.json())
+            except Exception:
+                failed = True
+            latencies[name].append(time.perf_counter() - start)
+            if failed: errors[name] += 1
+
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=60) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+
+    scenarios = {n: summarize(latencies[n], wall, errors[n]) for n in names if latencies[n]}
+    everything = [v for n in names for v in latencies[n]]
+    return {"concurrency": concurrency, "total": summarize(everything, wall, sum(errors.values())), "scenarios": scenarios}
+
+# List the p95 latencies that got slower than the baseline by more than the tolerance
+def compare(results: dict, baseline: dict, tolerance: float):
+    regressions = []
+    pairs = [(f"micro.{k}", v, baseline.get("micro", {}).get(k)) for k, v in results.get("micro", {}).items()]
+    load, old_load = results.get("load", {}), baseline.get("load", {})
+    if load: pairs.append(("load.total", load["total"], old_load.get("total")))
+    pairs += [(f"load.{k}", v, old_load.get("scenarios", {}).get(k)) for k, v in load.get("scenarios", {}).items()]
+    for name, new, old in pairs:
+        if old and old["p95_ms"] and new["p95_ms"] > old["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {old['p95_ms']:.4f}ms -> {new['p95_ms']:.4f}ms")
+    return regressions
+
+# Print a human-readable summary of the results
+def print_table(results: dict):
+    rows = [(f"micro.{k}", v) for k, v in results.get("micro", {}).items()]
+    if "load" in results:
+        rows.append(("load.total", results["load"]["total"]))
+        rows += [(f"load.{k}", v) for k, v in results["load"]["scenarios"].items()]
+    print(f"{'benchmark':<24}{'count':>8}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'req/s':>11}{'errors':>8}")
+    for name, s in rows:
+        print(f"{name:<24}{s['count']:>8}{s['p50_ms']:>11.3f}{s['p95_ms']:>11.3f}{s['p99_ms']:>11.3f}{s['throughput_rps']:>11.1f}{s['errors']:>8}")
+
+# Configure and import the server inside workdir, then run every benchmark against it
+def run_benchmarks(args, workdir: str) -> dict:
+    os.makedirs(os.path.join(workdir, "static"), exist_ok=True)
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{workdir}/bench.db"
+    os.environ["GEMINI_API_KEY"] = "benchmark-stub"
+    os.chdir(workdir)
+    sys.path.insert(0, str(BACKEND_DIR))
+    import server
+    import torch
+
+    server.chat_model = StubChatModel(args.gemini_latency)
+    db = server.SessionLocal()
+    try: empty = db.query(server.Food).count() == 0
+    finally: db.close()
+    if empty and Path(args.dump).exists(): seed_from_dump(server, Path(args.dump))
+
+    model_source = "checkpoint"
+    if Path(args.model).exists(): server.model_ai, server.CLASS_NAMES = server.load_ai_model(args.model)
+    if not server.model_ai:
+        server.model_ai, server.CLASS_NAMES = random_model()
+        model_source = "random"
+
+    image_bytes = sample_image_bytes()
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "torch": torch.__version__,
+            "cpu_count": os.cpu_count(), "torch_threads": torch.get_num_threads(),
+            "database": server.engine.dialect.name, "model": model_source,
+            "target": args.url or "in-process",
+        },
+        "micro": micro_benchmarks(server, image_bytes, args.iterations, args.warmup),
+    }
+    if args.requests > 0:
+        app = None if args.url else server.app
+        base_url = args.url or "http://benchmark"
+        results["load"] = asyncio.run(run_load(app, base_url, load_targets(server), image_bytes,
+                                               args.requests, args.concurrency, args.seed))
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run backend micro-benchmarks and an HTTP load scenario offline.")
+    parser.add_argument("--database-url", help="Database to benchmark against (default: a temporary SQLite file)")
+    parser.add_argument("--dump", default=str(BACKEND_DIR / "Dump20251222.sql"), help="SQL dump used to seed an empty database")
+    parser.add_argument("--model", default=str(BACKEND_DIR / "best_model_36classes.pth"), help="Checkpoint (random weights when missing)")
+    parser.add_argument("--iterations", type=int, default=50, help="Measured iterations per micro-benchmark")
+    parser.add_argument("--warmup", type=int, default=5, help="Warm-up iterations per micro-benchmark")
+    parser.add_argument("--requests", type=int, default=500, help="Total requests in the load scenario (0 skips it)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients in the load scenario")
+    parser.add_argument("--url", help="Load test a running server at this URL instead of the app in-process")
+    parser.add_argument("--gemini-latency", type=float, default=0.0, help="Seconds the stubbed Gemini client sleeps per message")
+    parser.add_argument("--seed", type=int, default=1234, help="Random seed for the request mix")
+    parser.add_argument("--out", default="benchmark_results.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 slowdown versus the baseline (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    out_path = Path(args.out).resolve()
+    baseline_path = Path(args.baseline).resolve() if args.baseline else None
+    args.dump, args.model = str(Path(args.dump).resolve()), str(Path(args.model).resolve())
+
+    # server.py reads its configuration at import time and serves ./static, so run it from a scratch directory
+    original_cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="vnfood-bench-")
+    try:
+        results = run_benchmarks(args, workdir)
+    finally:
+        os.chdir(original_cwd)
+        # Close pooled connections so the temporary SQLite file can be removed
+        if "server" in sys.modules: sys.modules["server"].engine.dispose()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    out_path.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print_table(results)
+    print(f"Results written to {out_path}")
+
+    if baseline_path:
+        regressions = compare(results, json.loads(baseline_path.read_text(encoding="utf-8")), args.tolerance)
+        for line in regressions: print(f"REGRESSION {line}")
+        if regressions: sys.exit(1)
+        print("No regressions against baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+# Gunicorn settings for serving the backend with several worker processes
+# Usage: gunicorn -c gunicorn.conf.py server:app
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn_worker.UvicornWorker"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+# Import server.py (and the model weights) once in the master, then fork workers sharing that memory
+preload_app = True
+
+# server.py reads this to split the torch threads between workers
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+# Reset per-process state that must not be inherited from the master
+def post_fork(server, worker):
+    from server import engine, configure_torch_threads, TORCH_THREADS
+    # Drop pooled DB connections opened by the master before the fork
+    engine.dispose(close=False)
+    configure_torch_threads(TORCH_THREADS)
+
+# Remove the metric files of exited workers when Prometheus runs in multiprocess mode
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,94 @@
+import os
+import time
+from contextvars import ContextVar
+
+from fastapi import Request
+from fastapi.responses import HTMLResponse
+from prometheus_client import Histogram, CollectorRegistry, REGISTRY, generate_latest, multiprocess
+from prometheus_client import CONTENT_TYPE_LATEST
+from sqlalchemy import event
+
+# Optional sampling profiler, only needed when per-request profiling is used
+try:
+    from pyinstrument import Profiler
+except ImportError:
+    Profiler = None
+
+# Metric definitions
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency by route", ["method", "route", "status"])
+REQUEST_QUERIES = Histogram("http_request_db_queries", "Database queries issued per HTTP request", ["route"],
+                            buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200))
+DB_QUERY_LATENCY = Histogram("db_query_duration_seconds", "Database query latency by statement type and outcome",
+                             ["operation", "status"],
+                             buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5))
+GEMINI_LATENCY = Histogram("gemini_request_duration_seconds", "Gemini chat API latency")
+INFERENCE_LATENCY = Histogram("inference_stage_duration_seconds", "Vision model latency by stage", ["stage"],
+                              buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5))
+
+# Mutable query counter of the request being served (shared with the tasks/threads it spawns)
+request_queries: ContextVar = ContextVar("request_queries", default=None)
+
+# Record one finished statement, timed from the start stored on its execution context
+def observe_query(context, statement, status: str):
+    start = getattr(context, "_query_start", None)
+    if start is None: return
+    del context._query_start
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement and statement.strip() else "UNKNOWN"
+    DB_QUERY_LATENCY.labels(operation, status).observe(time.perf_counter() - start)
+    counter = request_queries.get()
+    if counter is not None: counter[0] += 1
+
+# Attach timing hooks to every SQL statement executed by the engine
+# (start times live on the per-statement context, never on the pooled connection)
+def instrument_engine(engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None: context._query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        observe_query(context, statement, "ok")
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        observe_query(exception_context.execution_context, exception_context.statement, "error")
+
+# Check whether the X-Profile header matches PROFILE_TOKEN (profiling is disabled when the token is unset)
+def profiling_requested(request: Request) -> bool:
+    token = os.getenv("PROFILE_TOKEN")
+    return bool(token) and Profiler is not None and request.headers.get("X-Profile") == token
+
+# Run the request under the sampling profiler and return the HTML report instead of the response
+async def profile_request(request: Request, call_next):
+    profiler = Profiler(async_mode="enabled")
+    profiler.start()
+    try:
+        await call_next(request)
+    finally:
+        profiler.stop()
+    return HTMLResponse(profiler.output_html())
+
+# Time the request and count its DB queries, labelled by route template to keep cardinality low
+async def record_request(request: Request, call_next):
+    counter = [0]
+    request_queries.set(counter)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        path = route.path if route else "unmatched"
+        REQUEST_LATENCY.labels(request.method, path, str(status)).observe(time.perf_counter() - start)
+        REQUEST_QUERIES.labels(path).observe(counter[0])
+
+# Render all metrics in Prometheus text format (aggregating workers in multiprocess mode)
+def metrics_payload():
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
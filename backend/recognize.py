@@ -0,0 +1,243 @@
+# Offline batch recognition over image directories and tarballs with the 36-class model.
+# Usage: python recognize.py ../public/food_images static/food_images --out results.ndjson
+# Results are appended as they are produced; rerunning with the same --out skips images already done.
+# The true label of an image is taken from its folder or file name when that is a class name,
+# and is used to build the per-class confusion summary.
+import argparse
+import csv
+import io
+import json
+import multiprocessing
+import os
+import sys
+import tarfile
+import threading
+from collections import Counter, defaultdict
+from pathlib import Path, PurePosixPath
+from queue import Full
+
+import torch
+from PIL import Image
+from torch.utils.data import DataLoader, IterableDataset, get_worker_info
+
+from vision import preprocess, configure_torch_threads, load_ai_model
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif"}
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+CSV_FIELDS = ["path", "prediction", "confidence", "label", "error"]
+
+# Decode one image into a model-ready tensor, reporting failures instead of raising
+def load_image(key, data):
+    try:
+        image = Image.open(io.BytesIO(data) if isinstance(data, bytes) else data).convert("RGB")
+        return key, preprocess(image), None
+    except Exception as e:
+        return key, None, str(e) or type(e).__name__
+
+# Put an item on the queue, giving up once the run is being stopped
+def put_until_stopped(queue, item, stop) -> bool:
+    while not stop.is_set():
+        try:
+            queue.put(item, timeout=0.5)
+            return True
+        except Full:
+            continue
+    return False
+
+# Read every tarball once, handing raw image bytes to the decoding workers through a bounded queue
+def read_tarballs(tarballs, done, queue, consumers, stop):
+    try:
+        for tar_path in tarballs:
+            try:
+                with tarfile.open(tar_path, "r|*") as tar:
+                    for member in tar:
+                        if not member.isfile() or Path(member.name).suffix.lower() not in IMAGE_EXTENSIONS: continue
+                        key = f"{tar_path}::{member.name}"
+                        if key in done: continue
+                        if not put_until_stopped(queue, (key, tar.extractfile(member).read(), None), stop): return
+            except Exception as e:
+                put_until_stopped(queue, (tar_path, None, f"Unreadable archive: {e}"), stop)
+    finally:
+        # One end marker per consumer so every worker stops
+        for _ in range(consumers):
+            if not put_until_stopped(queue, None, stop): break
+
+# Stream images to DataLoader workers: each worker decodes every n-th file from the directories,
+# then takes tarball members from the shared queue filled by read_tarballs
+class ImageStream(IterableDataset):
+    def __init__(self, files, queue=None):
+        self.files = files
+        self.queue = queue
+
+    def __iter__(self):
+        info = get_worker_info()
+        worker_id, num_workers = (info.id, info.num_workers) if info else (0, 1)
+        for i, path in enumerate(self.files):
+            if i % num_workers == worker_id:
+                yield load_image(path, path)
+        if self.queue is None: return
+        for key, data, error in iter(self.queue.get, None):
+            yield load_image(key, data) if error is None else (key, None, error)
+
+# Keep decoding errors next to the batch of valid tensors
+def collate(items):
+    keys = [key for key, tensor, _ in items if tensor is not None]
+    tensors = torch.stack([tensor for _, tensor, _ in items if tensor is not None]) if keys else None
+    errors = [(key, error) for key, tensor, error in items if tensor is None]
+    return keys, tensors, errors
+
+# Keep the CPU for the main process doing inference; decoding needs one thread per worker
+def init_worker(worker_id):
+    torch.set_num_threads(1)
+
+# Expand the sources into image files and tarballs, skipping files already in the results
+def collect_sources(sources, done):
+    files, tarballs = [], []
+    for source in sources:
+        path = Path(source)
+        if path.is_dir():
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                for name in sorted(names):
+                    file_path = str(Path(root) / name)
+                    if Path(name).suffix.lower() in IMAGE_EXTENSIONS and file_path not in done:
+                        files.append(file_path)
+        elif path.is_file() and path.name.lower().endswith(TAR_SUFFIXES):
+            tarballs.append(str(path))
+        elif path.is_file():
+            if str(path) not in done: files.append(str(path))
+        else:
+            raise SystemExit(f"Source not found: {source}")
+    return files, tarballs
+
+# Guess the true class from the parent folder or the file name
+def label_for(key, classes):
+    parts = PurePosixPath(key.split("::")[-1].replace("\\", "/"))
+    for candidate in (parts.parent.name, parts.stem):
+        if candidate in classes: return candidate
+    return None
+
+# Read earlier results so the run can resume, dropping a partially written last line
+def read_existing(out_path: Path, fmt: str):
+    if not out_path.exists(): return []
+    data = out_path.read_bytes()
+    if data and not data.endswith(b"\n"):
+        data = data[:data.rfind(b"\n") + 1]
+        out_path.write_bytes(data)
+    text = data.decode("utf-8")
+    if fmt == "csv":
+        return list(csv.DictReader(io.StringIO(text)))
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+# Rewrite the results without failed entries so those images are retried instead of listed twice
+def drop_failed(out_path: Path, fmt: str, records):
+    kept = [r for r in records if not r.get("error")]
+    if len(kept) == len(records): return records
+    with open(out_path, "w", encoding="utf-8", newline="") as out:
+        if fmt == "csv":
+            writer = csv.DictWriter(out, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            writer.writerows(kept)
+        else:
+            for record in kept: out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return kept
+
+# Count predictions per true class and list the most frequent confusions
+def confusion_summary(records):
+    matrix = defaultdict(Counter)
+    unlabeled = errors = 0
+    for r in records:
+        if r.get("error"): errors += 1
+        elif not r.get("label"): unlabeled += 1
+        else: matrix[r["label"]][r["prediction"]] += 1
+    per_class = {}
+    for label in sorted(matrix):
+        total = sum(matrix[label].values())
+        correct = matrix[label][label]
+        confusions = [{"prediction": p, "count": c} for p, c in matrix[label].most_common() if p != label]
+        per_class[label] = {"total": total, "correct": correct, "accuracy": correct / total, "confused_with": confusions[:5]}
+    labeled = sum(c["total"] for c in per_class.values())
+    correct = sum(c["correct"] for c in per_class.values())
+    return {
+        "images": len(records), "labeled": labeled, "unlabeled": unlabeled, "errors": errors,
+        "accuracy": correct / labeled if labeled else None,
+        "classes": per_class,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recognize dishes in image directories or tarballs with the 36-class model.")
+    parser.add_argument("sources", nargs="+", help="Image directories, image files or .tar/.tar.gz archives")
+    parser.add_argument("--model", default="best_model_36classes.pth", help="Model checkpoint")
+    parser.add_argument("--out", default="recognition_results.ndjson", help="Results file, appended to incrementally")
+    parser.add_argument("--format", choices=["ndjson", "csv"], help="Results format (default: from the --out extension)")
+    parser.add_argument("--summary", help="Where to write the confusion summary JSON (default: <out>.summary.json)")
+    parser.add_argument("--batch-size", type=int, default=64, help="Images per inference batch")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1), help="DataLoader worker processes for decoding")
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1, help="Torch threads for inference")
+    parser.add_argument("--restart", action="store_true", help="Ignore existing results instead of resuming")
+    args = parser.parse_args(argv)
+
+    model, classes = load_ai_model(args.model)
+    if not model: raise SystemExit(f"Could not load model from {args.model}")
+    configure_torch_threads(args.threads)
+
+    out_path = Path(args.out)
+    fmt = args.format or ("csv" if out_path.suffix.lower() == ".csv" else "ndjson")
+    summary_path = Path(args.summary) if args.summary else out_path.with_name(out_path.name + ".summary.json")
+    if args.restart and out_path.exists(): out_path.unlink()
+    records = drop_failed(out_path, fmt, read_existing(out_path, fmt))
+    done = {r["path"] for r in records}
+    files, tarballs = collect_sources(args.sources, done)
+    if done: print(f"Resuming: {len(done)} images already processed")
+
+    queue = None
+    stop = threading.Event()
+    if tarballs:
+        # Archives are decompressed by a single reader thread; bounding the queue keeps memory flat
+        queue = multiprocessing.Queue(maxsize=args.batch_size * max(1, args.workers) * 2)
+        threading.Thread(target=read_tarballs, args=(tarballs, done, queue, max(1, args.workers), stop), daemon=True).start()
+    loader = DataLoader(ImageStream(files, queue), batch_size=args.batch_size, num_workers=args.workers,
+                        collate_fn=collate, worker_init_fn=init_worker)
+    new_file = not out_path.exists() or out_path.stat().st_size == 0
+    processed = 0
+    try:
+        with open(out_path, "a", encoding="utf-8", newline="") as out:
+            writer = csv.DictWriter(out, fieldnames=CSV_FIELDS) if fmt == "csv" else None
+            if writer and new_file: writer.writeheader()
+            for keys, tensors, errors in loader:
+                batch = [{"path": key, "prediction": None, "confidence": None, "label": label_for(key, classes), "error": error}
+                         for key, error in errors]
+                if keys:
+                    with torch.inference_mode():
+                        probs = torch.nn.functional.softmax(model(tensors), dim=1)
+                        top_prob, top_idx = probs.max(dim=1)
+                    for key, p, idx in zip(keys, top_prob.tolist(), top_idx.tolist()):
+                        batch.append({"path": key, "prediction": classes[idx], "confidence": p, "label": label_for(key, classes), "error": None})
+                for record in batch:
+                    # The same path can reach us twice, e.g. through overlapping sources
+                    if record["path"] in done: continue
+                    done.add(record["path"])
+                    records.append(record)
+                    processed += 1
+                    if writer: writer.writerow(record)
+                    else: out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                print(f"\rProcessed {processed} images", end="", file=sys.stderr, flush=True)
+    finally:
+        # Stop the tarball reader and let the process exit even if the queue still holds unread items
+        stop.set()
+        if queue is not None: queue.cancel_join_thread()
+    print(file=sys.stderr)
+
+    # CSV rows read back from disk hold strings, so normalise empty fields before summarising
+    summary = confusion_summary([{k: (v or None) for k, v in r.items()} for r in records])
+    summary_path.write_text(json.dumps(summary, indent=2, ensure_ascii=False), encoding="utf-8")
+    accuracy = f"{summary['accuracy']:.2%}" if summary["accuracy"] is not None else "n/a"
+    print(f"{summary['images']} images, {summary['labeled']} labeled, accuracy {accuracy}, {summary['errors']} errors")
+    for label, stats in summary["classes"].items():
+        confused = ", ".join(f"{c['prediction']} ({c['count']})" for c in stats["confused_with"][:3])
+        print(f"  {label:<20} {stats['correct']:>5}/{stats['total']:<5} {stats['accuracy']:>7.1%}  {confused}")
+    print(f"Results in {out_path}, summary in {summary_path}")
+
+if __name__ == "__main__":
+    main()
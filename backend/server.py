@@ -7,7 +7,7 @@ from datetime import datetime
 from typing import List, Optional
 from dotenv import load_dotenv
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends
+from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
@@ -17,17 +17,21 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session, relationship
 
 import torch
-import torchvision.transforms as transforms
-from torchvision import models
 from PIL import Image
 
 import google.generativeai as genai
 import firebase_admin
 from firebase_admin import credentials, auth as firebase_auth
 
-# Load environment variables from .env file
+# Load environment variables from .env file (before the local modules below read them)
 load_dotenv()
 
+from vision import preprocess, configure_torch_threads, load_ai_model
+from metrics import (
+    GEMINI_LATENCY, INFERENCE_LATENCY, instrument_engine, metrics_payload,
+    profiling_requested, profile_request, record_request,
+)
+
 # Database and API configurations
 DB_PASSWORD = os.getenv("DB_PASSWORD", "")
 DB_USER = os.getenv("DB_USER", "root")
@@ -95,29 +99,20 @@ MODEL_PATH = "best_model_36classes.pth"
 CLASS_NAMES = []
 model_ai = None
 
-# Load the trained AI model from disk
-def load_ai_model(path):
-    try:
-        checkpoint = torch.load(path, map_location=torch.device('cpu'))
-        classes = checkpoint["classes"]
-        m = models.resnet18(weights=None)
-        m.fc = torch.nn.Linear(m.fc.in_features, len(classes))
-        m.load_state_dict(checkpoint["model_state_dict"])
-        m.eval()
-        return m, classes
-    except Exception:
-        return None, []
+# Number of server worker processes and torch threads per worker (0 keeps the torch default)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+default_threads = max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY) if WEB_CONCURRENCY > 1 else 0
+TORCH_THREADS = int(os.getenv("TORCH_THREADS", default_threads))
+
+configure_torch_threads(TORCH_THREADS)
 
 # Process image bytes and return prediction
 def predict_image_ai(model, image_bytes, classes):
-    transform = transforms.Compose([
-        transforms.Resize((160, 160)),
-        transforms.ToTensor(),
-        transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-    ])
-    image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-    img_t = transform(image).unsqueeze(0)
-    with torch.no_grad():
+    with INFERENCE_LATENCY.labels("decode").time():
+        image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
+    with INFERENCE_LATENCY.labels("preprocess").time():
+        img_t = preprocess(image).unsqueeze(0)
+    with torch.no_grad(), INFERENCE_LATENCY.labels("forward").time():
         outputs = model(img_t)
         probs = torch.nn.functional.softmax(outputs, dim=1)
         top_prob, top_idx = probs.topk(1, dim=1)
@@ -132,11 +127,13 @@ try:
 except Exception as e:
     print(f"AI Vision Model Error: {e}")
 
-# Database Connection String
+# Database Connection String (DATABASE_URL overrides the MySQL settings, e.g. sqlite:///vnfood.db)
 encoded_password = quote_plus(DB_PASSWORD)
-SQLALCHEMY_DATABASE_URL = f"mysql+mysqlconnector://{DB_USER}:{encoded_password}@{DB_HOST}:3306/{DB_NAME}"
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL") or f"mysql+mysqlconnector://{DB_USER}:{encoded_password}@{DB_HOST}:3306/{DB_NAME}"
+connect_args = {"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_recycle=3600)
+engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_recycle=3600, connect_args=connect_args)
+instrument_engine(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -328,17 +325,30 @@ app.add_middleware(
 )
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+# Record per-route latency and DB usage; profile the request instead when the X-Profile header asks for it
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    if profiling_requested(request): return await profile_request(request, call_next)
+    return await record_request(request, call_next)
+
 # Health check endpoint
 @app.get("/")
 def read_root(): return {"message": "Backend Running"}
 
+# Prometheus metrics endpoint
+@app.get("/metrics")
+def get_metrics():
+    content, content_type = metrics_payload()
+    return Response(content=content, media_type=content_type)
+
 # Chat with Gemini AI
 @app.post("/api/chat")
 async def chat_with_chef(req: ChatRequest):
     if not GEMINI_KEY: return {"reply": "Server Error: API Key not configured."}
     try:
         chat_session = chat_model.start_chat(history=[]) 
-        response = chat_session.send_message(req.message)
+        with GEMINI_LATENCY.time():
+            response = chat_session.send_message(req.message)
         return {"reply": response.text}
     except Exception as e:
         print(f"GEMINI AI ERROR: {str(e)}")
@@ -0,0 +1,30 @@
+import torch
+import torchvision.transforms as transforms
+from torchvision import models
+
+# Image preprocessing expected by the trained ResNet18
+preprocess = transforms.Compose([
+    transforms.Resize((160, 160)),
+    transforms.ToTensor(),
+    transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+])
+
+# Limit torch intra-op threads so several workers do not oversubscribe the CPU
+def configure_torch_threads(num_threads: int):
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
+
+# Load the trained AI model from disk
+def load_ai_model(path):
+    try:
+        # Memory-map the checkpoint so all worker processes share one copy of the weights
+        try: checkpoint = torch.load(path, map_location=torch.device('cpu'), mmap=True)
+        except RuntimeError: checkpoint = torch.load(path, map_location=torch.device('cpu'))
+        classes = checkpoint["classes"]
+        m = models.resnet18(weights=None)
+        m.fc = torch.nn.Linear(m.fc.in_features, len(classes))
+        m.load_state_dict(checkpoint["model_state_dict"], assign=True)
+        m.eval()
+        return m, classes
+    except Exception:
+        return None, []